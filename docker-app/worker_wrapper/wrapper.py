@@ -173,7 +173,9 @@ class JobRun:
                 feedback["error_stack"] = ""
             else:
                 try:
-                    with open(self.shared_tempdir.joinpath("feedback.json")) as f:
+                    with open(
+                        self.shared_tempdir.joinpath("feedback.json"), encoding="utf-8"
+                    ) as f:
                         feedback = json.load(f)
 
                         if feedback.get("error"):
@@ -304,11 +304,6 @@ def cmd_process_projectfile(args: argparse.Namespace):
         name="Process Projectfile",
         version="2.0",
         steps=[
-            Step(
-                id="start_qgis_app",
-                name="Start QGIS Application",
-                method=qfc_worker.utils.start_app,
-            ),
             Step(
                 id="download_project_directory",
                 name="Download Project Directory",
@@ -328,6 +323,12 @@ def cmd_process_projectfile(args: argparse.Namespace):
                 },
                 method=qfc_worker.process_projectfile.check_valid_project_file,
             ),
+            # NOTE start the QGIS app only after the project file is known to be valid, so invalid files fail fast
+            Step(
+                id="start_qgis_app",
+                name="Start QGIS Application",
+                method=qfc_worker.utils.start_app,
+            ),
             Step(
                 id="opening_check",
                 name="Opening Check",
@@ -344,14 +345,15 @@ def cmd_process_projectfile(args: argparse.Namespace):
                     "project": StepOutput("opening_check", "project"),
                 },
                 method=qfc_worker.process_projectfile.extract_project_details,
-                return_names=["project_details"],
+                return_names=["project_details", "map_canvas_xml"],
                 outputs=["project_details"],
             ),
             Step(
                 id="generate_thumbnail_image",
                 name="Generate Thumbnail Image",
                 arguments={
-                    "project_filename": WorkDirPathAsStr("files", args.project_file),
+                    "project": StepOutput("opening_check", "project"),
+                    "map_canvas_xml": StepOutput("project_details", "map_canvas_xml"),
                     "thumbnail_filename": Path("/io/thumbnail.png"),
                 },
                 method=qfc_worker.process_projectfile.generate_thumbnail,
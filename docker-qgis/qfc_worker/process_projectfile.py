@@ -1,21 +1,23 @@
 import logging
+import zipfile
+import zlib
 from pathlib import Path
-from typing import Callable
+from typing import IO, Any
 from xml.etree import ElementTree
 
 from qgis.core import (
-    QgsLayerTree,
     QgsMapRendererCustomPainterJob,
     QgsMapSettings,
     QgsProject,
 )
 from qgis.PyQt.QtCore import QSize
-from qgis.PyQt.QtGui import QColor, QImage, QPainter
+from qgis.PyQt.QtGui import QColor, QImage, QImageWriter, QPainter
 from qgis.PyQt.QtXml import QDomDocument
 
 from .utils import (
     FailedThumbnailGenerationException,
     InvalidFileExtensionException,
+    InvalidQgisFileException,
     InvalidXmlFileException,
     ProjectFileNotFoundException,
     get_layers_data,
@@ -26,71 +28,80 @@ from .utils import (
 logger = logging.getLogger("PROCPRJ")
 
 
+def _check_valid_project_xml(fh: IO[bytes], project_filename: Path) -> None:
+    try:
+        # NOTE clear each element as soon as it is parsed, we only care about well-formedness and do not need the tree
+        for _event, elem in ElementTree.iterparse(fh, events=("end",)):
+            elem.clear()
+    except ElementTree.ParseError as error:
+        error_msg = str(error)
+        raise InvalidXmlFileException(
+            xml_error=get_qgis_xml_error_context(error_msg, fh) or error_msg,
+            project_filename=project_filename,
+        )
+
+
 def check_valid_project_file(project_filename: Path) -> None:
     logger.info("Check QGIS project file validity…")
 
-    if not project_filename.exists():
-        raise ProjectFileNotFoundException(project_filename=project_filename)
-
-    if project_filename.suffix == ".qgs":
-        with open(project_filename, "rb") as fh:
-            try:
-                for event, elem in ElementTree.iterparse(fh):
-                    continue
-            except ElementTree.ParseError as error:
-                error_msg = str(error)
-                raise InvalidXmlFileException(
-                    xml_error=get_qgis_xml_error_context(error_msg, fh) or error_msg,
-                    project_filename=project_filename,
-                )
-    elif project_filename.suffix != ".qgz":
+    if project_filename.suffix not in (".qgs", ".qgz"):
         raise InvalidFileExtensionException(
             project_filename=project_filename, extension=project_filename.suffix
         )
 
-    logger.info("QGIS project file is valid!")
-
-
-def extract_project_details(project: QgsProject) -> dict[str, str]:
-    """Extract project details"""
-    logger.info("Extract project details…")
-
-    details = {}
-
-    logger.info("Reading QGIS project file…")
-    map_settings = QgsMapSettings()
+    # NOTE open the file directly instead of checking if it exists first, saves a `stat` call
+    try:
+        fh = open(project_filename, "rb")
+    except FileNotFoundError:
+        raise ProjectFileNotFoundException(project_filename=project_filename)
 
-    def on_project_read_wrapper(
-        tmp_project: QgsProject,
-    ) -> Callable[[QDomDocument], None]:
-        def on_project_read(doc: QDomDocument) -> None:
-            r, _success = tmp_project.readNumEntry("Gui", "/CanvasColorRedPart", 255)
-            g, _success = tmp_project.readNumEntry("Gui", "/CanvasColorGreenPart", 255)
-            b, _success = tmp_project.readNumEntry("Gui", "/CanvasColorBluePart", 255)
-            background_color = QColor(r, g, b)
-            map_settings.setBackgroundColor(background_color)
+    with fh:
+        if project_filename.suffix == ".qgs":
+            _check_valid_project_xml(fh, project_filename)
+        else:
+            try:
+                with zipfile.ZipFile(fh) as zf:
+                    qgs_filenames = [n for n in zf.namelist() if n.endswith(".qgs")]
+
+                    if not qgs_filenames:
+                        raise InvalidQgisFileException(
+                            project_filename=project_filename,
+                            error="No .qgs file found in the archive.",
+                        )
+
+                    # NOTE stream the zipped .qgs directly, no need to extract it on disk
+                    with zf.open(qgs_filenames[0]) as qgs_fh:
+                        _check_valid_project_xml(qgs_fh, project_filename)
+            # NOTE a damaged archive may fail while reading the member as well, not only when opening it
+            except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as error:
+                raise InvalidQgisFileException(
+                    project_filename=project_filename, error=str(error)
+                )
 
-            details["background_color"] = background_color.name()
+    logger.info("QGIS project file is valid!")
 
-            nodes = doc.elementsByTagName("mapcanvas")
 
-            for i in range(nodes.size()):
-                node = nodes.item(i)
-                element = node.toElement()
-                if (
-                    element.hasAttribute("name")
-                    and element.attribute("name") == "theMapCanvas"
-                ):
-                    map_settings.readXml(node)
+def _get_map_canvas_xml(project_filename: str) -> str:
+    """Read the "theMapCanvas" element of the project file as XML string."""
+    canvas_xml = ""
 
-            map_settings.setRotation(0)
-            map_settings.setOutputSize(QSize(1024, 768))
+    def on_project_read(doc: QDomDocument) -> None:
+        nonlocal canvas_xml
 
-            details["extent"] = map_settings.extent().asWktPolygon()
+        nodes = doc.elementsByTagName("mapcanvas")
 
-        return on_project_read
+        for i in range(nodes.size()):
+            node = nodes.item(i)
+            element = node.toElement()
+            if (
+                element.hasAttribute("name")
+                and element.attribute("name") == "theMapCanvas"
+            ):
+                canvas_doc = QDomDocument()
+                canvas_doc.appendChild(canvas_doc.importNode(node, True))
+                canvas_xml = canvas_doc.toString()
 
-    # NOTE use a temporary project to get the project extent and background color
+    # NOTE use a temporary project to get the map canvas element
     # as we can disable resolving layers, which results in great speed gains
     tmp_project = QgsProject()
     tmp_project_read_flags = (
@@ -101,12 +112,52 @@ def extract_project_details(project: QgsProject) -> dict[str, str]:
         | QgsProject.FlagDontLoad3DViews
         | QgsProject.DontLoadProjectStyles
     )
-    tmp_project.readProject.connect(on_project_read_wrapper(tmp_project))
-    tmp_project.read(project.fileName(), tmp_project_read_flags)
+    tmp_project.readProject.connect(on_project_read)
+    tmp_project.read(project_filename, tmp_project_read_flags)
 
     # NOTE force delete the `QgsProject`, otherwise the `QgsApplication` might be deleted by the time the project is garbage collected
     del tmp_project
 
+    return canvas_xml
+
+
+def _get_map_settings(
+    project: QgsProject, map_canvas_xml: str, output_size: QSize
+) -> QgsMapSettings:
+    """Get the map settings as stored in the project's main map canvas."""
+    map_settings = QgsMapSettings()
+
+    r, _success = project.readNumEntry("Gui", "/CanvasColorRedPart", 255)
+    g, _success = project.readNumEntry("Gui", "/CanvasColorGreenPart", 255)
+    b, _success = project.readNumEntry("Gui", "/CanvasColorBluePart", 255)
+    map_settings.setBackgroundColor(QColor(r, g, b))
+
+    if map_canvas_xml:
+        doc = QDomDocument()
+        doc.setContent(map_canvas_xml)
+        map_settings.readXml(doc.documentElement())
+
+    map_settings.setRotation(0)
+    map_settings.setOutputSize(output_size)
+
+    return map_settings
+
+
+def extract_project_details(project: QgsProject) -> tuple[dict[str, Any], str]:
+    """Extract project details
+
+    Also returns the main map canvas element as XML string, so it can be reused for the thumbnail without reading the project file again.
+    """
+    logger.info("Extract project details…")
+
+    details = {}
+
+    logger.info("Reading QGIS project file…")
+    map_canvas_xml = _get_map_canvas_xml(project.fileName())
+    map_settings = _get_map_settings(project, map_canvas_xml, QSize(1024, 768))
+
+    details["background_color"] = map_settings.backgroundColor().name()
+    details["extent"] = map_settings.extent().asWktPolygon()
     details["crs"] = project.crs().authid()
     details["project_name"] = project.title()
 
@@ -122,69 +173,27 @@ def extract_project_details(project: QgsProject) -> dict[str, str]:
         f'QGIS project layer checks\n{layers_data_to_string(details["layers_by_id"])}',
     )
 
-    return details
+    return details, map_canvas_xml
 
 
-def generate_thumbnail(project_filename: str, thumbnail_filename: Path) -> None:
+def generate_thumbnail(
+    project: QgsProject, map_canvas_xml: str, thumbnail_filename: Path
+) -> None:
     """Create a thumbnail for the project
 
     As from https://docs.qgis.org/3.16/en/docs/pyqgis_developer_cookbook/composer.html#simple-rendering
 
     Args:
-        project_filename (str)
+        project (QgsProject): the already loaded project, its layers are reused for rendering
+        map_canvas_xml (str): the main map canvas element as returned by `extract_project_details`
         thumbnail_filename (Path)
     """
     logger.info("Generate project thumbnail image…")
 
-    map_settings = QgsMapSettings()
-
-    def on_project_read_wrapper(
-        tmp_project: QgsProject,
-        tmp_layer_tree: QgsLayerTree,
-    ) -> Callable[[QDomDocument], None]:
-        def on_project_read(doc: QDomDocument) -> None:
-            r, _success = tmp_project.readNumEntry("Gui", "/CanvasColorRedPart", 255)
-            g, _success = tmp_project.readNumEntry("Gui", "/CanvasColorGreenPart", 255)
-            b, _success = tmp_project.readNumEntry("Gui", "/CanvasColorBluePart", 255)
-            map_settings.setBackgroundColor(QColor(r, g, b))
-
-            nodes = doc.elementsByTagName("mapcanvas")
-
-            for i in range(nodes.size()):
-                node = nodes.item(i)
-                element = node.toElement()
-                if (
-                    element.hasAttribute("name")
-                    and element.attribute("name") == "theMapCanvas"
-                ):
-                    map_settings.readXml(node)
-
-            map_settings.setRotation(0)
-            map_settings.setTransformContext(tmp_project.transformContext())
-            map_settings.setPathResolver(tmp_project.pathResolver())
-            map_settings.setOutputSize(QSize(100, 100))
-            map_settings.setLayers(reversed(list(tmp_layer_tree.customLayerOrder())))
-
-        return on_project_read
-
-    # NOTE use a temporary project to generate the layer rendering with improved speed
-    tmp_project = QgsProject()
-    tmp_layer_tree = tmp_project.layerTreeRoot()
-    tmp_project_read_flags = (
-        # TODO we use `QgsProject` read flags, as the ones in `Qgis.ProjectReadFlags` do not work in QGIS 3.34.2
-        QgsProject.ReadFlags()
-        | QgsProject.ForceReadOnlyLayers
-        | QgsProject.FlagDontLoadLayouts
-        | QgsProject.FlagDontLoad3DViews
-        | QgsProject.DontLoadProjectStyles
-    )
-    tmp_project.readProject.connect(
-        on_project_read_wrapper(tmp_project, tmp_layer_tree)
-    )
-    tmp_project.read(
-        project_filename,
-        tmp_project_read_flags,
-    )
+    map_settings = _get_map_settings(project, map_canvas_xml, QSize(100, 100))
+    map_settings.setTransformContext(project.transformContext())
+    map_settings.setPathResolver(project.pathResolver())
+    map_settings.setLayers(project.layerTreeRoot().layerOrder())
 
     img = QImage(map_settings.outputSize(), QImage.Format_ARGB32)
     painter = QPainter(img)
@@ -193,17 +202,23 @@ def generate_thumbnail(project_filename: str, thumbnail_filename: Path) -> None:
     # `waitForFinishedWithEventLoop` hangs forever and `waitForFinished` produces blank thumbnail, so don't use them!
     job.renderSynchronously()
 
-    if not img.save(str(thumbnail_filename)):
-        raise FailedThumbnailGenerationException(reason="Failed to save.")
+    # NOTE the thumbnail is just a preview, use the fastest zlib compression level 1.
+    # Qt takes a 0-100 value for PNG and scales it to zlib 0-9 as `value * 9 / 91`, so 11 maps to 1 (while 1 maps to 0, no compression at all!)
+    writer = QImageWriter(str(thumbnail_filename), b"PNG")
+    writer.setCompression(11)
+
+    if not writer.write(img):
+        raise FailedThumbnailGenerationException(
+            reason=f"Failed to save: {writer.errorString()}"
+        )
 
     painter.end()
 
-    # NOTE force delete the `QgsMapRendererCustomPainterJob`, `QPainter` and `QImage` because we are paranoid with Cpp objects around
+    # NOTE force delete the `QgsMapRendererCustomPainterJob`, `QPainter`, `QImage` and `QImageWriter` because we are paranoid with Cpp objects around
     del job
     del painter
     del img
-    # NOTE force delete the `QgsProject`, otherwise the `QgsApplication` might be deleted by the time the project is garbage collected
-    del tmp_project
+    del writer
 
     logger.info("Project thumbnail image generated!")
 
@@ -3,7 +3,6 @@ import gc
 import hashlib
 import inspect
 import io
-import json
 import logging
 import os
 import re
@@ -14,11 +13,14 @@ import tempfile
 import traceback
 import uuid
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import IO, Any, Callable, NamedTuple, Optional
 
+import orjson
 from libqfieldsync.layer import LayerSource
 from libqfieldsync.utils.bad_layer_handler import (
     bad_layer_handler,
@@ -475,6 +477,16 @@ class Workflow:
 
 
 class Step:
+    __slots__ = (
+        "id",
+        "name",
+        "method",
+        "arguments",
+        "return_names",
+        "outputs",
+        "stage",
+    )
+
     def __init__(
         self,
         id: str,
@@ -494,6 +506,18 @@ class Step:
         self.outputs = outputs
         self.stage = 0
 
+    def get_feedback(self, step_returns: dict[str, dict[str, Any]]) -> dict[str, Any]:
+        """Get the step summary as part of the workflow feedback.
+
+        Only completed steps report their return values.
+        """
+        return {
+            "id": self.id,
+            "name": self.name,
+            "stage": self.stage,
+            "returns": step_returns[self.id] if self.stage == 2 else {},
+        }
+
 
 class StepOutput:
     def __init__(self, step_id: str, return_name: str):
@@ -571,6 +595,11 @@ def has_ping(hostname: str) -> bool:
     return not bool(error) and "100% packet loss" not in out.decode("utf8")
 
 
+@lru_cache(maxsize=256)
+def _probe_host(hostname: str, port: Optional[int]) -> bool:
+    return is_localhost(hostname, port) or has_ping(hostname)
+
+
 def get_layer_filename(layer: QgsMapLayer) -> Optional[str]:
     metadata = QgsProviderRegistry.instance().providerMetadata(
         layer.dataProvider().name()
@@ -632,6 +661,43 @@ def json_default(obj):
     return f"<non-serializable: {obj_str}>"
 
 
+def _json_key(key: Any) -> str:
+    if isinstance(key, str):
+        return str(key)
+    elif key is None:
+        return "null"
+    elif isinstance(key, bool):
+        return "true" if key else "false"
+    elif isinstance(key, int):
+        return int.__repr__(key)
+    elif isinstance(key, float):
+        return float.__repr__(key)
+
+    return json_default(key)
+
+
+def to_json_compatible(obj: Any) -> Any:
+    """Convert the value to plain JSON types the same way the stdlib `json` module serializes it.
+
+    `orjson` natively serializes types like `Enum`, `datetime`, `UUID` or dataclasses,
+    while `json` passes them to `json_default`, e.g. the QGIS enums in the layers data.
+    """
+    if obj is None or isinstance(obj, bool):
+        return obj
+    elif isinstance(obj, str):
+        return str(obj)
+    elif isinstance(obj, int):
+        return int(obj)
+    elif isinstance(obj, float):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {_json_key(k): to_json_compatible(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [to_json_compatible(v) for v in obj]
+
+    return json_default(obj)
+
+
 def run_workflow(
     workflow: Workflow,
     feedback_filename: Optional[Path | IO],
@@ -661,23 +727,21 @@ def run_workflow(
         root_workdir = Path(tempfile.mkdtemp())
         for step in workflow.steps:
             with logger_context(step):
-                arguments = {
-                    **step.arguments,
-                }
-                for name, value in arguments.items():
+                arguments = {}
+                for name, value in step.arguments.items():
                     if isinstance(value, StepOutput):
-                        arguments[name] = step_returns[value.step_id][value.return_name]
+                        value = step_returns[value.step_id][value.return_name]
                     elif isinstance(value, WorkDirPathBase):
-                        arguments[name] = value.eval(root_workdir)
+                        value = value.eval(root_workdir)
+
+                    arguments[name] = value
 
                 return_values = step.method(**arguments)
                 return_values = (
                     return_values if len(step.return_names) > 1 else (return_values,)
                 )
 
-                step_returns[step.id] = {}
-                for name, value in zip(step.return_names, return_values):
-                    step_returns[step.id][name] = value
+                step_returns[step.id] = dict(zip(step.return_names, return_values))
 
     except Exception as err:
         feedback["error"] = str(err)
@@ -699,7 +763,7 @@ def run_workflow(
                 feedback["error_type"] = "API_OTHER"
         elif isinstance(err, FileNotFoundError):
             feedback["error_type"] = "FILE_NOT_FOUND"
-        elif isinstance(err, InvalidXmlFileException):
+        elif isinstance(err, (InvalidXmlFileException, InvalidQgisFileException)):
             feedback["error_type"] = "INVALID_PROJECT_FILE"
         else:
             feedback["error_type"] = "UNKNOWN"
@@ -708,61 +772,56 @@ def run_workflow(
         feedback["error_class"] = type(err).__name__
         feedback["error_stack"] = traceback.format_tb(tb)
     finally:
-        feedback["steps"] = []
-        feedback["outputs"] = {}
+        feedback["steps"] = [step.get_feedback(step_returns) for step in workflow.steps]
+        feedback["outputs"] = {
+            step.id: {name: step_returns[step.id][name] for name in step.outputs}
+            for step in workflow.steps
+            if step.stage == 2
+        }
 
-        for step in workflow.steps:
-            step_feedback = {
-                "id": step.id,
-                "name": step.name,
-                "stage": step.stage,
-                "returns": {},
-            }
-
-            if step.stage == 2:
-                step_feedback["returns"] = step_returns[step.id]
-                feedback["outputs"][step.id] = {}
-                for output_name in step.outputs:
-                    feedback["outputs"][step.id][output_name] = step_returns[step.id][
-                        output_name
-                    ]
-
-            feedback["steps"].append(step_feedback)
-
-        if isinstance(feedback_filename, io.IOBase):
-            feedback_filename.write("Feedback:")
-            json.dump(
-                feedback,
-                feedback_filename,
-                indent=2,
-                sort_keys=True,
-                default=json_default,
+        if isinstance(feedback_filename, (io.IOBase, Path)):
+            # NOTE unlike `json`, `orjson` writes non-ASCII characters as UTF-8 and NaN/Infinity floats as `null`
+            feedback_json = orjson.dumps(
+                to_json_compatible(feedback),
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS,
             )
-        elif isinstance(feedback_filename, Path):
-            with open(feedback_filename, "w") as f:
-                json.dump(feedback, f, indent=2, sort_keys=True, default=json_default)
+
+            if isinstance(feedback_filename, io.IOBase):
+                feedback_filename.write("Feedback:")
+                feedback_filename.write(feedback_json.decode("utf8"))
+            else:
+                feedback_filename.write_bytes(feedback_json)
 
         return feedback
 
 
 def get_layers_data(project: QgsProject) -> dict[str, dict]:
     layers_by_id = {}
+    hosts_to_probe: dict[str, tuple[str, Optional[int]]] = {}
+    # NOTE QGIS already knows whether all layers are valid, then there is no need to ask each layer
+    all_layers_valid = project.count() == project.validCount()
 
     for layer in project.mapLayers().values():
         error = layer.error()
         layer_id = layer.id()
+        layer_type = layer.type()
+        layer_crs = layer.crs()
         layer_source = LayerSource(layer)
+        data_provider = layer.dataProvider()
         datasource = None
 
-        if layer.dataProvider():
-            datasource = layer.dataProvider().uri().uri()
+        if data_provider:
+            # NOTE `layer.source()` returns the stored string, while `data_provider.uri().uri()` parses and serializes it again.
+            # The value is not always the same: file paths are kept as they are, key order and quoting of database and
+            # web service sources are as stored, and `authcfg` is no longer expanded into the actual credentials.
+            datasource = layer.source()
 
-        layers_by_id[layer_id] = {
+        layer_data = layers_by_id[layer_id] = {
             "id": layer_id,
             "name": layer.name(),
-            "crs": layer.crs().authid() if layer.crs() else None,
+            "crs": layer_crs.authid() if layer_crs else None,
             "wkb_type": layer.wkbType()
-            if layer.type() == QgsMapLayer.VectorLayer
+            if layer_type == QgsMapLayer.VectorLayer
             else None,
             "qfs_action": layer.customProperty("QFieldSync/action"),
             "qfs_cloud_action": layer.customProperty("QFieldSync/cloud_action"),
@@ -774,75 +833,81 @@ def get_layers_data(project: QgsProject) -> dict[str, dict]:
             "qfs_unsupported_source_pk": layer.customProperty(
                 "QFieldSync/unsupported_source_pk"
             ),
-            "is_valid": layer.isValid(),
+            "is_valid": all_layers_valid or layer.isValid(),
             "is_localized": layer_source.is_localized_path,
             "datasource": datasource,
-            "type": layer.type(),
-            "type_name": layer.type().name,
+            "type": layer_type,
+            "type_name": layer_type.name,
             "error_code": "no_error",
             "error_summary": error.summary() if error.messageList() else "",
-            "error_message": layer.error().message(),
+            "error_message": error.message(),
             "filename": layer_source.filename,
             "provider_name": None,
             "provider_error_summary": None,
             "provider_error_message": None,
         }
 
-        if layers_by_id[layer_id]["is_valid"]:
+        if layer_data["is_valid"]:
             continue
 
-        data_provider = layer.dataProvider()
-
         if data_provider:
             data_provider_error = data_provider.error()
 
             if data_provider.isValid():
                 # there might be another reason why the layer is not valid, other than the data provider
-                layers_by_id[layer_id]["error_code"] = "invalid_layer"
+                layer_data["error_code"] = "invalid_layer"
             else:
                 if layer_source.is_localized_path:
-                    layers_by_id[layer_id]["error_code"] = "localized_dataprovider"
+                    layer_data["error_code"] = "localized_dataprovider"
                 else:
-                    layers_by_id[layer_id]["error_code"] = "invalid_dataprovider"
+                    layer_data["error_code"] = "invalid_dataprovider"
 
-            layers_by_id[layer_id]["provider_error_summary"] = (
+            layer_data["provider_error_summary"] = (
                 data_provider_error.summary()
                 if data_provider_error.messageList()
                 else ""
             )
-            layers_by_id[layer_id][
-                "provider_error_message"
-            ] = data_provider_error.message()
+            layer_data["provider_error_message"] = data_provider_error.message()
+            layer_data["provider_name"] = data_provider.name()
 
-            layers_by_id[layer_id]["provider_name"] = data_provider.name()
+            if not layer_data["provider_error_summary"]:
+                uri = data_provider.uri()
 
-            if not layers_by_id[layer_id]["provider_error_summary"]:
-                service = data_provider.uri().service()
+                service = uri.service()
                 if service:
-                    layers_by_id[layer_id][
+                    layer_data[
                         "provider_error_summary"
                     ] = f'Unable to connect to service "{service}".'
 
-                host = data_provider.uri().host()
-                port = (
-                    int(data_provider.uri().port())
-                    if data_provider.uri().port()
-                    else None
-                )
-                if host and (is_localhost(host, port) or has_ping(host)):
-                    layers_by_id[layer_id][
-                        "provider_error_summary"
-                    ] = f'Unable to connect to host "{host}".'
+                host = uri.host()
+                port = uri.port()
+                if host:
+                    # NOTE the host probing is slow, it is done for all layers at once after the loop
+                    hosts_to_probe[layer_id] = (host, int(port) if port else None)
 
                 path = layer_source.metadata.get("path")
                 if path and not os.path.exists(path):
-                    layers_by_id[layer_id]["error_summary"] = f'File "{path}" missing.'
+                    layer_data["error_summary"] = f'File "{path}" missing.'
 
         else:
-            layers_by_id[layer_id]["error_code"] = "missing_dataprovider"
-            layers_by_id[layer_id][
-                "provider_error_summary"
-            ] = "No data provider available"
+            layer_data["error_code"] = "missing_dataprovider"
+            layer_data["provider_error_summary"] = "No data provider available"
+
+    if hosts_to_probe:
+        # NOTE many layers usually share the same host, probe each host only once
+        unique_hosts = list(set(hosts_to_probe.values()))
+
+        # NOTE probe the hosts in parallel, so the total time is the slowest probe rather than the sum of all probes
+        with ThreadPoolExecutor(max_workers=min(32, len(unique_hosts))) as executor:
+            probe_results = dict(
+                zip(unique_hosts, executor.map(lambda h: _probe_host(*h), unique_hosts))
+            )
+
+        for layer_id, host_and_port in hosts_to_probe.items():
+            if probe_results[host_and_port]:
+                layers_by_id[layer_id][
+                    "provider_error_summary"
+                ] = f'Unable to connect to host "{host_and_port[0]}".'
 
     return layers_by_id
 
@@ -990,7 +1055,7 @@ def get_qgis_xml_error_location(
 
 
 def get_qgis_xml_error_context(
-    invalid_token_error_msg: str, fh: io.BufferedReader
+    invalid_token_error_msg: str, fh: IO[bytes]
 ) -> Optional[str]:
     """Get a slice of the line where the exception occurred, with all faulty occurrences sanitized."""
     location = get_qgis_xml_error_location(invalid_token_error_msg)
@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from qfc_worker.process_projectfile import check_valid_project_file
+from qfc_worker.utils import InvalidQgisFileException, InvalidXmlFileException
+
+VALID_QGS = b'<qgis version="3.38.1"><title>Test</title>' + b"<a/>" * 1000 + b"</qgis>"
+
+
+class CheckValidProjectFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def make_qgz(self, members: dict[str, bytes]) -> Path:
+        filename = Path(self.tmp_dir.name, "project.qgz")
+
+        with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, content in members.items():
+                zf.writestr(name, content)
+
+        return filename
+
+    def test_valid_qgz(self):
+        filename = self.make_qgz({"project.qgs": VALID_QGS, "project.qgd": b""})
+
+        check_valid_project_file(filename)
+
+    def test_qgz_without_qgs(self):
+        filename = self.make_qgz({"project.qgd": b""})
+
+        with self.assertRaises(InvalidQgisFileException):
+            check_valid_project_file(filename)
+
+    def test_qgz_with_invalid_xml(self):
+        filename = self.make_qgz({"project.qgs": b"<qgis>\n<title>\x01</title></qgis>"})
+
+        with self.assertRaises(InvalidXmlFileException):
+            check_valid_project_file(filename)
+
+    def test_qgz_not_a_zip(self):
+        filename = Path(self.tmp_dir.name, "project.qgz")
+        filename.write_bytes(VALID_QGS)
+
+        with self.assertRaises(InvalidQgisFileException):
+            check_valid_project_file(filename)
+
+    def test_qgz_with_corrupt_member(self):
+        filename = self.make_qgz({"project.qgs": VALID_QGS})
+
+        with zipfile.ZipFile(filename) as zf:
+            info = zf.getinfo("project.qgs")
+
+        # flip a byte in the middle of the deflate stream of the member
+        content = bytearray(filename.read_bytes())
+        data_offset = info.header_offset + 30 + len(info.filename)
+        content[data_offset + info.compress_size // 2] ^= 0xFF
+        filename.write_bytes(bytes(content))
+
+        with self.assertRaises(InvalidQgisFileException):
+            check_valid_project_file(filename)
+
+    def test_qgz_truncated(self):
+        filename = self.make_qgz({"project.qgs": VALID_QGS})
+
+        with zipfile.ZipFile(filename) as zf:
+            info = zf.getinfo("project.qgs")
+
+        # drop part of the member data, while keeping the central directory at the end
+        content = filename.read_bytes()
+        data_offset = info.header_offset + 30 + len(info.filename)
+        filename.write_bytes(
+            content[:data_offset] + content[data_offset + info.compress_size // 2 :]
+        )
+
+        with self.assertRaises(InvalidQgisFileException):
+            check_valid_project_file(filename)